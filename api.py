@@ -1,48 +1,165 @@
 import asyncio
 import os
+import re
 from concurrent.futures import ThreadPoolExecutor
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from contextlib import asynccontextmanager
+import aiohttp
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import FileResponse, ORJSONResponse
 from fastapi.logger import logger
 from utils import (
     fetch_news_articles,
-    scrape_article_content,
-    analyze_sentiment,
-    extract_key_topics,
-    generate_hindi_tts
+    scrape_article_content_async,
+    analyze_contents,
+    generate_hindi_summary_tts,
+    prepare_models,
+    sweep_tts_cache,
+    TTS_CACHE_DIR
 )
 
-app = FastAPI(title="News Analyzer API")
-executor = ThreadPoolExecutor(max_workers=4)
+NEWS_API_KEY = os.getenv("NEWS_API_KEY")
+TTS_SWEEP_SECONDS = 600
+TTS_FILE_RE = re.compile(r"^[0-9a-f]{40}\.wav$")
 
-@app.get("/analyze")
-async def analyze_company_news(
-    company: str, 
-    background_tasks: BackgroundTasks
+async def sweep_tts_cache_periodically():
+    """Keep the TTS audio cache under its size cap"""
+    loop = asyncio.get_event_loop()
+    while True:
+        try:
+            await loop.run_in_executor(executor, sweep_tts_cache)
+        except Exception as e:
+            logger.error(f"TTS cache sweep failed: {str(e)}")
+        await asyncio.sleep(TTS_SWEEP_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Prepare models, share one pooled HTTP session and sweep the TTS cache"""
+    prepare_models()
+    # limit_per_host is the only per-host politeness limit on scraping
+    connector = aiohttp.TCPConnector(
+        limit=32,
+        limit_per_host=2,
+        keepalive_timeout=30,
+        use_dns_cache=True,
+        ttl_dns_cache=300
+    )
+    app.state.http = aiohttp.ClientSession(connector=connector)
+    sweeper = asyncio.create_task(sweep_tts_cache_periodically())
+    yield
+    sweeper.cancel()
+    await app.state.http.close()
+
+app = FastAPI(
+    title="News Analyzer API",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
+executor = ThreadPoolExecutor(max_workers=16)
+
+ANALYSIS_BATCH_SIZE = 8
+BATCH_FLUSH_SECONDS = 0.05
+
+async def scrape_article(item: dict, session: aiohttp.ClientSession):
+    """Scrape a single news item, skipping ones without usable content"""
+    if not item['url'].startswith('http'):
+        return None
+
+    article = await scrape_article_content_async(item['url'], session)
+    if not article['content']:
+        return None
+    # NewsAPI's own description is the article summary; fall back to scraped text
+    return {**article, 'summary': item.get('description') or article['content']}
+
+async def scrape_into_queue(
+    news_items: list,
+    session: aiohttp.ClientSession,
+    queue: asyncio.Queue
 ):
-    """Main analysis endpoint"""
-    try:
-        news_items = fetch_news_articles(company)
-        processed_articles = []
+    """Producer: push each article onto the queue as soon as it is scraped"""
+    async def scrape_one(item: dict):
+        try:
+            article = await scrape_article(item, session)
+        except Exception as e:
+            logger.error(f"Article scraping failed: {str(e)}")
+            return
+        if article is not None:
+            await queue.put(article)
+
+    await asyncio.gather(*[scrape_one(item) for item in news_items])
+    # Sentinel: no more articles are coming
+    await queue.put(None)
+
+async def analyze_from_queue(queue: asyncio.Queue) -> list:
+    """Consumer: analyze scraped articles in small batches while scraping continues"""
+    loop = asyncio.get_event_loop()
+    processed_articles = []
+    finished = False
 
-        for item in news_items:
+    while not finished:
+        article = await queue.get()
+        if article is None:
+            break
+        batch = [article]
+
+        # Flush a partial batch after a short deadline so stragglers aren't held back
+        deadline = loop.time() + BATCH_FLUSH_SECONDS
+        while len(batch) < ANALYSIS_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
             try:
-                if not item['url'].startswith('http'):
-                    continue
-                
-                article = scrape_article_content(item['url'])
-                if not article['content']:
-                    continue
-                    
-                processed_articles.append({
-                    'title': article['title'],
-                    'summary': article['summary'],
-                    'sentiment': analyze_sentiment(article['content']),
-                    'topics': extract_key_topics(article['content'])
-                })
-            except Exception as e:
-                logger.error(f"Article processing failed: {str(e)}")
-                continue
+                article = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if article is None:
+                finished = True
+                break
+            batch.append(article)
+
+        try:
+            analyses = await loop.run_in_executor(
+                executor,
+                analyze_contents,
+                [article['content'] for article in batch]
+            )
+        except Exception as e:
+            # Drop the failed batch but keep analyzing the rest
+            logger.error(f"Article analysis failed for {len(batch)} articles: {str(e)}")
+            continue
+        processed_articles.extend(
+            {
+                'title': article['title'],
+                'summary': article['summary'],
+                'sentiment': analysis['sentiment'],
+                'topics': analysis['topics']
+            }
+            for article, analysis in zip(batch, analyses)
+        )
+
+    return processed_articles
+
+@app.get("/analyze")
+async def analyze_company_news(company: str):
+    """Main analysis endpoint"""
+    try:
+        loop = asyncio.get_event_loop()
+        # requests is blocking; keep it off the event loop
+        news_items = await loop.run_in_executor(
+            executor,
+            fetch_news_articles,
+            company,
+            NEWS_API_KEY
+        )
+        queue = asyncio.Queue()
+        producer = asyncio.create_task(
+            scrape_into_queue(news_items, app.state.http, queue)
+        )
+        try:
+            processed_articles = await analyze_from_queue(queue)
+            await producer
+        finally:
+            # Don't leave scrapes running after the consumer has failed
+            producer.cancel()
 
         if not processed_articles:
             raise HTTPException(
@@ -50,20 +167,33 @@ async def analyze_company_news(
                 detail="No articles could be processed"
             )
 
-        tts_summary = f"{company} analysis: {len(processed_articles)} articles processed"
-        tts_path = await asyncio.get_event_loop().run_in_executor(
-            executor, 
-            generate_hindi_tts, 
-            tts_summary
+        tts_path = await loop.run_in_executor(
+            executor,
+            generate_hindi_summary_tts,
+            company,
+            len(processed_articles)
         )
 
-        background_tasks.add_task(os.remove, tts_path)
-        
         return {
             'company': company,
             'articles': processed_articles,
-            'tts_path': tts_path
+            'tts_path': tts_path,
+            'tts_url': f"/tts/{os.path.basename(tts_path)}"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Critical error: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.get("/tts/{file_name}")
+async def get_tts_audio(file_name: str):
+    """Serve cached Hindi summary audio"""
+    path = os.path.join(TTS_CACHE_DIR, file_name)
+    if not TTS_FILE_RE.match(file_name) or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Audio not found")
+    return FileResponse(
+        path,
+        media_type="audio/wav",
+        headers={"Cache-Control": "public, max-age=86400"}
+    )
\ No newline at end of file
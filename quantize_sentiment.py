@@ -0,0 +1,37 @@
+"""
+One-time export of the sentiment model to int8 ONNX
+Usage: python quantize_sentiment.py [output_dir]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from onnxruntime.quantization import quantize_dynamic, QuantType
+from optimum.onnxruntime import ORTModelForSequenceClassification
+from transformers import AutoTokenizer
+
+SENTIMENT_MODEL = "cardiffnlp/twitter-roberta-base-sentiment"
+
+def main(output_dir: str = "sentiment_int8"):
+    with tempfile.TemporaryDirectory() as export_dir:
+        # Export the FP32 graph, then quantize its weights to int8
+        model = ORTModelForSequenceClassification.from_pretrained(
+            SENTIMENT_MODEL,
+            export=True
+        )
+        model.save_pretrained(export_dir)
+
+        os.makedirs(output_dir, exist_ok=True)
+        quantize_dynamic(
+            os.path.join(export_dir, "model.onnx"),
+            os.path.join(output_dir, "model.onnx"),
+            weight_type=QuantType.QInt8
+        )
+        shutil.copy(os.path.join(export_dir, "config.json"), output_dir)
+
+    AutoTokenizer.from_pretrained(SENTIMENT_MODEL).save_pretrained(output_dir)
+    print(f"Quantized sentiment model written to {output_dir}")
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -3,31 +3,171 @@ News analysis utilities including:
 - News fetching and scraping (via NewsAPI)
 - Sentiment analysis
 - Topic extraction
-- Translation and TTS
+- Hindi TTS
 """
 
+import codecs
+import functools
+import hashlib
+import html as html_lib
+import os
+import re
+import threading
+import time
+import asyncio
+import aiohttp
 import requests
-from bs4 import BeautifulSoup
+import lxml.etree
+import lxml.html
 from transformers import pipeline, VitsModel, AutoTokenizer
 import spacy
-from googletrans import Translator
+from indic_transliteration import sanscript
+from cachetools import TTLCache
 import soundfile as sf
-from typing import List, Dict
+from typing import List, Dict, Optional
 import tempfile
 import torch
+from concurrent.futures import ThreadPoolExecutor
 
-# Initialize models once
-sentiment_analyzer = pipeline(
-    "sentiment-analysis",
-    model="cardiffnlp/twitter-roberta-base-sentiment"
+# Resolved per worker in prepare_models(): probing CUDA here would initialise
+# the driver in the gunicorn master before it forks
+DEVICE = "cpu"
+
+SENTIMENT_MODEL = "cardiffnlp/twitter-roberta-base-sentiment"
+# Directory produced by quantize_sentiment.py
+SENTIMENT_ONNX_DIR = os.getenv("SENTIMENT_ONNX_DIR", "sentiment_int8")
+# Worker processes sharing this machine's cores (gunicorn reads the same variable)
+WORKER_COUNT = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+# Truncation policy: the sentiment tokenizer cuts input at the model's
+# 512-token limit, while NER only sees the first NER_MAX_CHARS characters
+# since the business entities we report cluster near the top of an article.
+SENTIMENT_TOKENIZER_KWARGS = {"truncation": True, "max_length": 512, "padding": True}
+NER_MAX_CHARS = 2000
+
+def load_sentiment_analyzer():
+    """Load the PyTorch sentiment pipeline"""
+    return pipeline(
+        "sentiment-analysis",
+        model=SENTIMENT_MODEL,
+        tokenizer=AutoTokenizer.from_pretrained(SENTIMENT_MODEL, use_fast=True),
+        **SENTIMENT_TOKENIZER_KWARGS
+    )
+
+def load_onnx_sentiment_analyzer():
+    """Load the int8 ONNX sentiment pipeline exported by quantize_sentiment.py"""
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+
+    sess_options = onnxruntime.SessionOptions()
+    # Split the cores between workers instead of oversubscribing them
+    sess_options.intra_op_num_threads = max(1, (os.cpu_count() or 1) // WORKER_COUNT)
+    ort_model = ORTModelForSequenceClassification.from_pretrained(
+        SENTIMENT_ONNX_DIR,
+        provider="CPUExecutionProvider",
+        session_options=sess_options
+    )
+    tokenizer = AutoTokenizer.from_pretrained(SENTIMENT_ONNX_DIR, use_fast=True)
+    return pipeline(
+        "sentiment-analysis",
+        model=ort_model,
+        tokenizer=tokenizer,
+        batch_size=16,
+        **SENTIMENT_TOKENIZER_KWARGS
+    )
+
+# Initialize models once, on CPU. Weights loaded at import are shared
+# copy-on-write across forked workers (gunicorn --preload); each worker
+# then moves them to its device in prepare_models().
+# An ONNX Runtime session is not fork-safe (its thread pool doesn't survive
+# fork), so when the int8 export exists prepare_models() builds it per worker.
+sentiment_analyzer = None if os.path.isdir(SENTIMENT_ONNX_DIR) else load_sentiment_analyzer()
+# Only the NER component is needed for topic extraction
+nlp = spacy.load(
+    "en_core_web_sm",
+    disable=["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer"]
 )
-nlp = spacy.load("en_core_web_sm")
-translator = Translator()
 tts_tokenizer = AutoTokenizer.from_pretrained("facebook/mms-tts-hin")
-tts_model = VitsModel.from_pretrained("facebook/mms-tts-hin")
+tts_model = VitsModel.from_pretrained("facebook/mms-tts-hin", low_cpu_mem_usage=True)
+
+SCRAPE_TIMEOUT = aiohttp.ClientTimeout(total=10)
+TOPIC_LABELS = frozenset({'ORG', 'PRODUCT', 'GPE', 'NORP'})
+
+# Both non-empty description tags in one tree walk; name=description wins over og:description
+META_DESCRIPTION_XPATH = lxml.etree.XPath(
+    "//meta[normalize-space(@content)][@name='description' or @property='og:description']"
+)
+# name may come before or after content; the backreference lets the value
+# contain the other quote character (e.g. "Wall Street's")
+META_DESCRIPTION_RE = re.compile(
+    rb'<meta\s(?=[^>]*\bname\s*=\s*(["\'])description\1)'
+    rb'[^>]*?\bcontent\s*=\s*(["\'])(?P<content>.*?)\2',
+    re.I | re.S
+)
+TITLE_RE = re.compile(rb'<title[^>]*>(.*?)</title>', re.I | re.S)
+# The meta-description fast path almost always hits within the first 64KB
+SCRAPE_PREFIX_HEADERS = {"Range": "bytes=0-65535"}
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+# News article URLs are immutable, so scrapes and analyses are safe to reuse
+scrape_cache = TTLCache(maxsize=2048, ttl=3600)
+analysis_cache = TTLCache(maxsize=2048, ttl=3600)
+analysis_cache_lock = threading.Lock()
+# NER runs here while sentiment runs on the caller's thread; one worker
+# also keeps the spaCy pipeline from being used concurrently
+topic_executor = ThreadPoolExecutor(max_workers=1)
+NEWS_CACHE_SECONDS = 300
+
+# Synthesized audio is stored by content hash and reused across requests
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "tts_cache"))
+TTS_CACHE_MAX_BYTES = 500 * 1024 * 1024
+# Partial writes older than this were left behind by a killed worker
+TTS_PARTIAL_MAX_AGE_SECONDS = 3600
+os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+
+# Hindi rendering of the fixed summary sentence, so it needs no translation
+HINDI_SUMMARY_TEMPLATE = "{company} विश्लेषण: {n} लेख संसाधित"
+# Rewrite English spellings into ITRANS-friendly ones before
+# transliterating, e.g. "Microsoft" -> "mikrosofT", "Tesla" -> "Teslaa"
+ITRANS_SPELLING_RULES = [
+    (re.compile(r"c(?=[eiy])"), "s"),
+    (re.compile(r"c(?!h)"), "k"),
+    (re.compile(r"x"), "ks"),
+    (re.compile(r"q"), "k"),
+    (re.compile(r"w"), "v"),
+    (re.compile(r"(?<=\w[^aeiou\W])e\b"), ""),
+    # English t/d are retroflex (ट/ड), and a final "a" is long (टेस्ला)
+    (re.compile(r"t(?!h)"), "T"),
+    (re.compile(r"d(?!h)"), "D"),
+    (re.compile(r"ia\b"), "iyaa"),
+    (re.compile(r"(?<!a)a\b"), "aa"),
+]
+DEVANAGARI_RE = re.compile("[\u0900-\u097F]")
+
+def cache_by_url(cache: TTLCache):
+    """Memoize an async scraper on its url argument; failed scrapes raise and are not cached"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(url: str, *args, **kwargs):
+            if url in cache:
+                return cache[url]
+            result = await func(url, *args, **kwargs)
+            cache[url] = result
+            return result
+        return wrapper
+    return decorator
 
 def fetch_news_articles(company: str, api_key: str, max_results: int = 10) -> List[Dict]:
-    """Fetch news articles using NewsAPI."""
+    """Fetch news articles using NewsAPI, reusing responses within a 5-minute window."""
+    date_bucket = int(time.time() // NEWS_CACHE_SECONDS)
+    return list(_fetch_news_articles(company, api_key, max_results, date_bucket))
+
+@functools.lru_cache(maxsize=256)
+def _fetch_news_articles(company: str, api_key: str, max_results: int, date_bucket: int) -> tuple:
+    """Query NewsAPI; date_bucket only serves as part of the cache key.
+
+    Error responses raise, so lru_cache never stores them.
+    """
     news_api_url = "https://newsapi.org/v2/everything"
     keywords = "stock OR market OR shares OR revenue OR earnings OR merger OR acquisition"
     params = {
@@ -37,71 +177,292 @@ def fetch_news_articles(company: str, api_key: str, max_results: int = 10) -> Li
         "sortBy": "publishedAt",
         "apiKey": api_key  # Use the provided API key
     }
-    response = requests.get(news_api_url, params=params)
+    response = requests.get(news_api_url, params=params, timeout=10)
     data = response.json()
-    return data.get("articles", [])
+    if data.get("status") != "ok":
+        raise RuntimeError(f"NewsAPI request failed: {data.get('message', response.status_code)}")
+    return tuple(data.get("articles", []))
 
-def scrape_article_content(url: str) -> dict:
-    """Extract title and content from the article's webpage."""
+def resolve_charset(charset: Optional[str]) -> str:
+    """Normalize a declared charset, falling back to UTF-8 when missing or unknown."""
     try:
-        response = requests.get(url, timeout=10)
+        return codecs.lookup(charset).name if charset else "utf-8"
+    except LookupError:
+        return "utf-8"
+
+def decode_html_text(raw: bytes, charset: str = "utf-8") -> str:
+    """Decode and unescape a text fragment matched in raw HTML."""
+    return html_lib.unescape(raw.decode(charset, errors="replace")).strip()
+
+def parse_article_meta(html: bytes, charset: str = "utf-8") -> Optional[dict]:
+    """Extract title and meta description by regex, or None if either is unusable."""
+    meta_match = META_DESCRIPTION_RE.search(html)
+    title_match = TITLE_RE.search(html)
+    if meta_match and title_match:
+        content = decode_html_text(meta_match.group("content"), charset)
+        if len(content) >= 100:
+            return {"title": decode_html_text(title_match.group(1), charset), "content": content}
+    return None
+
+def parse_article(
+    html: bytes,
+    complete: bool = True,
+    charset: Optional[str] = None
+) -> Optional[dict]:
+    """Extract title and content from an article's HTML.
+
+    With complete=False, html is only a prefix of the page: the title and
+    meta description are read from it, and None is returned when the
+    paragraph fallback would need the full document. charset is the one
+    declared in the Content-Type header, if any.
+    """
+    # Fast path: a long enough meta description needs no DOM at all
+    article = parse_article_meta(html, resolve_charset(charset))
+    if article:
+        return article
+
+    parser = lxml.html.HTMLParser(encoding=resolve_charset(charset)) if charset else None
+    tree = lxml.html.fromstring(html, parser=parser)
+    
+    # Extract title
+    title = (tree.findtext(".//title") or "").strip() or "No title available"
+    
+    # Extract content
+    metas = META_DESCRIPTION_XPATH(tree)
+    meta = next((m for m in metas if m.get("name") == "description"), None)
+    if meta is None and metas:
+        meta = metas[0]
+    content = meta.get("content").strip() if meta is not None else ""
+    
+    # Fallback to body text
+    if not content or len(content) < 100:
+        if not complete:
+            return None
+        article_body = tree.find(".//article")
+        if article_body is None:
+            article_body = tree
+        content = "\n".join(
+            "".join(text.strip() for text in p.itertext())
+            for p in article_body.iter("p")
+        )
+    
+    return {"title": title, "content": content or "No content available."}
+
+async def fetch_html(url: str, session: aiohttp.ClientSession, headers: Optional[dict] = None):
+    """GET a page and return (status, charset, body), or None if it is not HTML."""
+    async with session.get(url, headers=headers, timeout=SCRAPE_TIMEOUT) as response:
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-        
-        # Extract title
-        title = soup.title.text.strip() if soup.title else "No title available"
-        
-        # Extract content
-        content = ""
-        meta_desc = soup.find("meta", attrs={"name": "description"})
-        if meta_desc and meta_desc.get("content"):
-            content = meta_desc.get("content").strip()
-        else:
-            og_desc = soup.find("meta", property="og:description")
-            if og_desc and og_desc.get("content"):
-                content = og_desc.get("content").strip()
-        
-        # Fallback to body text
-        if not content or len(content) < 100:
-            article_body = soup.find("article") or soup
-            paragraphs = article_body.find_all("p")
-            content = "\n".join(p.get_text(strip=True) for p in paragraphs)
-        
-        return {"title": title, "content": content or "No content available."}
+        # Skip PDFs, images and the like before reading the body
+        content_type = response.headers.get("Content-Type", "").lower()
+        if not any(html_type in content_type for html_type in HTML_CONTENT_TYPES):
+            return None
+        return response.status, response.charset, await response.read()
+
+@cache_by_url(scrape_cache)
+async def scrape_article_content_async(url: str, session: aiohttp.ClientSession) -> dict:
+    """Extract title and content from the article's webpage using a shared session."""
+    try:
+        return await fetch_article_async(url, session)
     
     except Exception as e:
-        return {"title": "Error", "content": f"Error scraping article: {e}"}
-    
-def analyze_sentiment(text: str) -> str:
-    """Perform sentiment analysis on text"""
+        raise RuntimeError(f"Error scraping article {url}: {str(e)}") from e
+
+async def fetch_article_async(url: str, session: aiohttp.ClientSession) -> dict:
+    """Fetch and parse an article, reading the full page only when needed.
+
+    Parsing runs in the default executor so the event loop keeps driving
+    other scrapes and the analysis batch deadline.
+    """
+    loop = asyncio.get_running_loop()
+    fetched = await fetch_html(url, session, SCRAPE_PREFIX_HEADERS)
+    if fetched is None:
+        return {"title": "Skipped", "content": ""}
+    status, charset, html = fetched
+
+    partial = status == 206
+    article = await loop.run_in_executor(None, parse_article, html, not partial, charset)
+    if article:
+        return article
+
+    # Only the paragraph fallback needs the whole document
+    fetched = await fetch_html(url, session)
+    if fetched is None:
+        return {"title": "Skipped", "content": ""}
+    _, charset, html = fetched
+    return await loop.run_in_executor(None, parse_article, html, True, charset)
+
+def analyze_sentiments(texts: List[str]) -> List[str]:
+    """Perform sentiment analysis on a batch of texts in one forward pass"""
+    if not texts:
+        return []
     try:
-        result = sentiment_analyzer(text[:512])[0]
+        # Tokenize the whole batch at once and skip the pipeline's per-sample loop
+        model = sentiment_analyzer.model
+        inputs = sentiment_analyzer.tokenizer(
+            texts,
+            return_tensors="pt",
+            **SENTIMENT_TOKENIZER_KWARGS
+        ).to(sentiment_analyzer.device)
+        with torch.inference_mode():
+            label_ids = model(**inputs).logits.argmax(dim=-1).tolist()
         label_map = {
             'LABEL_0': 'Negative',
             'LABEL_1': 'Neutral',
             'LABEL_2': 'Positive'
         }
-        return label_map.get(result['label'], 'Neutral')
+        return [
+            label_map.get(model.config.id2label[label_id], 'Neutral')
+            for label_id in label_ids
+        ]
     except Exception as e:
         raise RuntimeError(f"Sentiment analysis failed: {str(e)}")
 
-def extract_key_topics(text: str, max_topics: int = 5) -> List[str]:
-    """Extract key topics using spaCy NER"""
-    doc = nlp(text)
-    entities = [ent.text for ent in doc.ents if ent.label_ in ['ORG', 'PRODUCT', 'GPE', 'NORP']]
-    return list(set(entities))[:max_topics]
+def extract_key_topics_batch(texts: List[str], max_topics: int = 5) -> List[List[str]]:
+    """Extract key topics for a batch of texts using spaCy NER"""
+    topics = []
+    truncated = (text[:NER_MAX_CHARS] for text in texts)
+    for doc in nlp.pipe(truncated, batch_size=16):
+        # Ordered dedup keeps the earliest mentions and stops once enough are found
+        seen = {}
+        for ent in doc.ents:
+            if ent.label_ in TOPIC_LABELS and ent.text not in seen:
+                seen[ent.text] = None
+                if len(seen) >= max_topics:
+                    break
+        topics.append(list(seen))
+    return topics
+
+def analyze_contents(contents: List[str]) -> List[Dict]:
+    """Run sentiment and topic extraction, reusing results for previously seen content"""
+    keys = [
+        hashlib.blake2b(content.encode(), digest_size=16).digest()
+        for content in contents
+    ]
+    with analysis_cache_lock:
+        results = {key: analysis_cache[key] for key in keys if key in analysis_cache}
+
+    misses = {}
+    for key, content in zip(keys, contents):
+        if key not in results:
+            misses.setdefault(key, content)
+
+    if misses:
+        miss_contents = list(misses.values())
+        topics_future = topic_executor.submit(extract_key_topics_batch, miss_contents)
+        sentiments = analyze_sentiments(miss_contents)
+        topics = topics_future.result()
+        with analysis_cache_lock:
+            for key, sentiment, content_topics in zip(misses, sentiments, topics):
+                results[key] = {"sentiment": sentiment, "topics": content_topics}
+                analysis_cache[key] = results[key]
+
+    return [results[key] for key in keys]
+
+def tts_waveform(hindi_text: str) -> torch.Tensor:
+    """Run the VITS forward pass for Hindi text"""
+    with torch.inference_mode():
+        inputs = tts_tokenizer(hindi_text, return_tensors="pt")
+        inputs = {k: v.to(DEVICE) for k, v in inputs.items()}
+        return tts_model(**inputs).waveform
+
+def move_pipeline_to_device(pipe) -> None:
+    """Move a PyTorch-backed pipeline onto DEVICE; ONNX pipelines stay on CPU"""
+    if isinstance(pipe.model, torch.nn.Module):
+        pipe.model.to(DEVICE)
+        pipe.device = torch.device(DEVICE)
+
+def prepare_models() -> None:
+    """Pick DEVICE, move models to it, compile and warm up. Call once per worker process."""
+    global DEVICE, sentiment_analyzer, tts_model
+    DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+    if sentiment_analyzer is None:
+        sentiment_analyzer = load_onnx_sentiment_analyzer()
+    if DEVICE == "cuda":
+        move_pipeline_to_device(sentiment_analyzer)
+        tts_model = tts_model.to(DEVICE, dtype=torch.float16)
+        # Input lengths vary per request, so compile with dynamic shapes;
+        # CUDA graphs (reduce-overhead) would re-record for every length
+        tts_model = torch.compile(tts_model, dynamic=True, fullgraph=False)
+
+    # Warm up on a realistic summary so the first request doesn't pay for compilation
+    tts_waveform(HINDI_SUMMARY_TEMPLATE.format(company="टेस्ला", n=10))
+
+def synthesize_hindi_speech(hindi_text: str) -> str:
+    """Synthesize Hindi text to a cached WAV file and return its path"""
+    key = hashlib.sha1(hindi_text.encode()).hexdigest()
+    path = os.path.join(TTS_CACHE_DIR, f"{key}.wav")
+    try:
+        # Refresh mtime so the sweeper treats it as recently used
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        # Not cached yet, or swept since the last request
+        pass
+
+    waveform = tts_waveform(hindi_text)
+    # Mono [T] float32 is already contiguous, so soundfile writes it without a copy
+    audio_array = waveform.squeeze(0).to(torch.float32).cpu().numpy()
+
+    # Write to a private file and rename, so readers never see a partial WAV
+    fd, tmp_path = tempfile.mkstemp(suffix=".part", dir=TTS_CACHE_DIR)
+    os.close(fd)
+    try:
+        sf.write(
+            tmp_path,
+            audio_array,
+            samplerate=tts_model.config.sampling_rate,
+            format="WAV",
+            subtype="PCM_16"
+        )
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return path
+
+def sweep_tts_cache(max_bytes: int = TTS_CACHE_MAX_BYTES) -> None:
+    """Delete least recently used cached audio until the cache fits in max_bytes"""
+    entries = []
+    now = time.time()
+    for entry in os.scandir(TTS_CACHE_DIR):
+        if not entry.is_file():
+            continue
+        try:
+            stat = entry.stat()
+            if entry.name.endswith(".wav"):
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            elif entry.name.endswith(".part") and now - stat.st_mtime > TTS_PARTIAL_MAX_AGE_SECONDS:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            continue
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def transliterate_to_devanagari(name: str) -> str:
+    """Spell a (usually English) proper noun in Devanagari by sound, not meaning"""
+    if DEVANAGARI_RE.search(name):
+        return name
+    spelling = name.lower()
+    for pattern, replacement in ITRANS_SPELLING_RULES:
+        spelling = pattern.sub(replacement, spelling)
+    return sanscript.transliterate(spelling, sanscript.ITRANS, sanscript.DEVANAGARI)
 
-def generate_hindi_tts(text: str) -> str:
-    """Generate Hindi speech from text"""
+def generate_hindi_summary_tts(company: str, n_articles: int) -> str:
+    """Generate Hindi speech for the analysis summary from a fixed template"""
     try:
-        translated = translator.translate(text, dest='hi').text
-        with torch.no_grad():
-            inputs = tts_tokenizer(translated, return_tensors="pt")
-            waveform = tts_model(**inputs).waveform
-            audio_array = waveform.cpu().detach().numpy().T
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-            sf.write(f.name, audio_array, tts_model.config.sampling_rate)
-            return f.name
+        hindi_text = HINDI_SUMMARY_TEMPLATE.format(
+            company=transliterate_to_devanagari(company),
+            n=n_articles
+        )
+        return synthesize_hindi_speech(hindi_text)
     except Exception as e:
         raise RuntimeError(f"TTS generation failed: {str(e)}")
 